@@ -17,14 +17,14 @@ export default function AIorNOT() {
   const loadNextImage = async () => {
     if (!session) return;
     
-    const { team_name, password, server_session } = session;
+    const { team_name, token, server_session } = session;
     try {
       const res = await fetch("/backend/image", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           team_name,
-          password,
+          token,
           session_id: "session_001",
           server_session,
           imageiter: imageiter.current
@@ -65,7 +65,7 @@ export default function AIorNOT() {
   const handleGuess = async (guessIsAI: boolean) => {
     if (!currentImage || !session) return;
     
-    const { team_name, password, server_session } = session;
+    const { team_name, token, server_session } = session;
 
     try {
       const res = await fetch("/backend/verify", {
@@ -73,7 +73,7 @@ export default function AIorNOT() {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           team_name,
-          password,
+          token,
           session_id: "session_001",
           server_session,
           user_guess: guessIsAI ? "ai" : "human",
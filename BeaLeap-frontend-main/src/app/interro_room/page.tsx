@@ -278,19 +278,19 @@ export default function InterrogationRoom() {
       return;
     }
 
-    const { team_name, password, server_session } = session;
+    const { team_name, token, server_session } = session;
     // cancel previous request if active
     if (abortRef.current) abortRef.current.abort(); 
     abortRef.current = new AbortController();
 
     setLoading(true);
     try {
-      const res = await fetch("/backend/ask", {
+      const res = await fetch("/backend/ask/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
     team_name: team_name,
-    password: password, 
+    token: token,
     user_input: prompt,          // your text box input
     session_id: "session_001",      // any random string
     server_session: server_session,
@@ -309,9 +309,32 @@ export default function InterrogationRoom() {
         window.location.href = "/";
       }
 
-      if (!res.ok) throw new Error(`Server error: ${res.status}`);
+      if (!res.ok || !res.body) throw new Error(`Server error: ${res.status}`);
+
+      // Server-Sent Events: show tokens as they arrive, the "done" event has the final text
+      const data = { response: "" };
+      let streamed = "";
+      let buffer = "";
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const raw of events) {
+          if (!raw.startsWith("data: ")) continue;
+          const event = JSON.parse(raw.slice(6));
+          if (event.type === "token") {
+            streamed += event.text;
+            setReply(streamed);
+          } else if (event.type === "done") {
+            data.response = event.response;
+          }
+        }
+      }
 
-      const data = await res.json();
       if (data.response.includes("CORRECT!")) {
         setStage((s) => s + 1);
       } else if (data.response.includes("YOU WIN")) {
@@ -14,10 +14,10 @@ export default function LoginPage() {
   // 🚀 Redirect if already logged in
   useEffect(() => {
     const team = localStorage.getItem("team_name");
-    const pass = localStorage.getItem("team_password");
+    const token = localStorage.getItem("team_token");
     const serverSession = localStorage.getItem("server_session");
 
-    if (team && pass && serverSession) {
+    if (team && token && serverSession) {
       // User is already logged in, could redirect to main page
       // router.replace("/");
     }
@@ -57,10 +57,10 @@ export default function LoginPage() {
       // ✅ Store credentials and session
       console.log("GOT HERE....")
       localStorage.setItem("team_name", teamName);
-      localStorage.setItem("team_password", password);
+      localStorage.setItem("team_token", data.token);
       localStorage.setItem("server_session", data.server_session);;
 
-    saveTeamSession(teamName, password, data.server_session);
+    saveTeamSession(teamName, data.token, data.server_session);
 
 
       router.replace("/"); // redirect to main menu
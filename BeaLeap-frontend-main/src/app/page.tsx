@@ -11,12 +11,12 @@ export default function BeatLeap() {
   useEffect(() => {
     const verifyLogin = async () => {
       const team = localStorage.getItem("team_name");
-      const pass = localStorage.getItem("team_password");
+      const token = localStorage.getItem("team_token");
       const session = localStorage.getItem("server_session");
 
 
       // ✅ If not logged in → redirect immediately
-      if (!team || !pass || !session) {
+      if (!team || !token || !session) {
         localStorage.clear();
         router.replace("/login");
         return;
@@ -54,6 +54,24 @@ export default function BeatLeap() {
     verifyLogin();
   }, [router]);
 
+  // 📡 Live game open/close updates instead of polling /games/status
+  useEffect(() => {
+    const session = localStorage.getItem("server_session");
+    if (!session) return;
+
+    const base = process.env.NEXT_PUBLIC_API_URL || `${window.location.origin}/backend`;
+    const url = `${base.replace(/^http/, "ws")}/ws/live?server_session=${encodeURIComponent(session)}`;
+    const ws = new WebSocket(url);
+
+    ws.onmessage = (e) => {
+      const msg = JSON.parse(e.data);
+      if (!msg.games) return;
+      setStatus((prev) => (msg.type === "snapshot" ? msg.games : { ...(prev ?? {}), ...msg.games }));
+    };
+
+    return () => ws.close();
+  }, []);
+
   // ⏳ While checking login or redirecting
   if (loading) {
     return (
@@ -57,13 +57,13 @@ export default function StoryHuntUploader() {
     if (!items.length && !story.trim()) return;
     if (!session) return;
     
-    const { team_name, password, server_session } = session;
+    const { team_name, token, server_session } = session;
     
     setBusy(true); setMsg("Uploading...");
 
     const fd = new FormData();
     fd.append("team_name", team_name);
-    fd.append("password", password);
+    fd.append("token", token);
     fd.append("server_session", server_session);
     items.forEach((it) => fd.append("files", it.file));
 
@@ -80,7 +80,7 @@ export default function StoryHuntUploader() {
         const resText = await fetch(TEXT_ENDPOINT, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ team_name, password, server_session, story }),
+          body: JSON.stringify({ team_name, token, server_session, story }),
         });
         if (!resText.ok) throw new Error(`HTTP ${resText.status}`);
         setStory("");
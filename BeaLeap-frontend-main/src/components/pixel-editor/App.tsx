@@ -58,7 +58,7 @@ const App: React.FC = () => {
   const fetchLatestImage = async () => {
       if (!session) return;
       
-      const { team_name, password, server_session } = session;
+      const { team_name, token, server_session } = session;
       
 
       try {
@@ -67,10 +67,11 @@ const App: React.FC = () => {
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
             team_name,
-            password,
+            token,
             session_id: "session_001",
             server_session,
-            imageiter: imageiter.current
+            imageiter: imageiter.current,
+            format: "url"
           }),
         });
         if (!res.ok) {
@@ -81,38 +82,12 @@ const App: React.FC = () => {
         
 
         const data = await res.json();
-        const img = new Image();
-        img.onload = () => {
-          const canvas = document.createElement("canvas");
-          canvas.width = GRID_SIZE;
-          canvas.height = GRID_SIZE;
-          const ctx = canvas.getContext("2d", { willReadFrequently: true });
-          if (!ctx) return;
-
-          ctx.drawImage(img, 0, 0, GRID_SIZE, GRID_SIZE);
-          const imageData = ctx.getImageData(0, 0, GRID_SIZE, GRID_SIZE);
-          const pixels = imageData.data;
-          const newGrid: PixelGridType = createEmptyGrid();
-
-          for (let y = 0; y < GRID_SIZE; y++) {
-            for (let x = 0; x < GRID_SIZE; x++) {
-              const i = (y * GRID_SIZE + x) * 4;
-              const r = pixels[i];
-              const g = pixels[i + 1];
-              const b = pixels[i + 2];
-              const a = pixels[i + 3];
-              if (a < 128 || (r > 250 && g > 250 && b > 250)) {
-                newGrid[y][x] = null;
-              } else {
-                newGrid[y][x] = rgbToHex(r, g, b);
-              }
-            }
-          }
-          setGrid(newGrid);
-          setOriginalImageGrid(newGrid);
-          setPixelsEdited(0);
-        };
-        img.src = data.image_data;
+        // Start from the server's grid: it is the baseline submissions are scored
+        // against, and the canvas' own downsampling of the image doesn't match it.
+        const newGrid: PixelGridType = data.grid;
+        setGrid(newGrid);
+        setOriginalImageGrid(newGrid);
+        setPixelsEdited(0);
         imageiter.current = data.image_iter;
 
       } catch (err) {
@@ -229,7 +204,7 @@ const App: React.FC = () => {
   const handleDownload = async () => {
   if (!session) return;
   
-  const { team_name, server_session } = session;
+  const { team_name, token, server_session } = session;
   
   const downloadSize = 1000;
   const scale = downloadSize / GRID_SIZE;
@@ -271,6 +246,7 @@ const App: React.FC = () => {
       body: JSON.stringify({
         image_data: dataUrl, // send full base64 image
         team_name,
+        token,
         serversession: server_session,
         imageiter: imageiter.current,
         changed: pixelsEdited
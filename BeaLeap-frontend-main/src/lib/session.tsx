@@ -1,11 +1,11 @@
 // lib/session.ts
 
-// ✅ Save team login info in sessionStorage
-export function saveTeamSession(team_name: string, password: string, server_session: string) {
+// ✅ Save team login info in sessionStorage (the signed token from /login, never the password)
+export function saveTeamSession(team_name: string, token: string, server_session: string) {
   if (typeof window === "undefined") return; // only run client-side
 
   sessionStorage.setItem("team_name", team_name);
-  sessionStorage.setItem("password", password);
+  sessionStorage.setItem("token", token);
   sessionStorage.setItem("server_session", server_session);
 }
 
@@ -14,12 +14,12 @@ export function getTeamSession() {
   if (typeof window === "undefined") return null;
 
   const team_name = sessionStorage.getItem("team_name");
-  const password = sessionStorage.getItem("password");
+  const token = sessionStorage.getItem("token");
   const server_session = sessionStorage.getItem("server_session");
 
-  if (!team_name || !password || !server_session) return null;
+  if (!team_name || !token || !server_session) return null;
 
-  return { team_name, password, server_session };
+  return { team_name, token, server_session };
 }
 
 // ✅ Clear session when logging out
@@ -27,6 +27,6 @@ export function clearTeamSession() {
   if (typeof window === "undefined") return;
 
   sessionStorage.removeItem("team_name");
-  sessionStorage.removeItem("password");
+  sessionStorage.removeItem("token");
   sessionStorage.removeItem("server_session");
-}
\ No newline at end of file
+}
@@ -0,0 +1,73 @@
+"""
+Signed, expiring session tokens for teams.
+
+/login checks the password once and hands out a token of the form
+``<team>.<expires>.<signature>`` (HMAC-SHA256 over team + expiry). Every
+other request sends the token instead of the password; verification is a
+constant-time HMAC comparison, and tokens that already verified are kept in
+a small in-memory cache so the hot endpoints skip even that.
+"""
+
+import base64
+import hashlib
+import hmac
+import threading
+import time
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class TokenSigner:
+    def __init__(self, secret: str, ttl: int = 12 * 3600, cache_size: int = 4096):
+        self._key = secret.encode()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._verified: dict[str, tuple[str, int]] = {}  # token -> (team, expires)
+        self._lock = threading.Lock()
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, team_name: str) -> tuple[str, int]:
+        """Return (token, expires_at_unix) for ``team_name``."""
+        expires = int(time.time()) + self.ttl
+        payload = f"{_b64(team_name.encode())}.{expires}"
+        return f"{payload}.{self._sign(payload)}", expires
+
+    def verify(self, token: str) -> str | None:
+        """Team name the token was issued to, or None if it is forged or expired."""
+        if not token:
+            return None
+        now = time.time()
+
+        hit = self._verified.get(token)
+        if hit is not None:
+            team, expires = hit
+            if now < expires:
+                return team
+            with self._lock:
+                self._verified.pop(token, None)
+            return None
+
+        try:
+            team_b64, expires_s, signature = token.split(".")
+            expires = int(expires_s)
+            team = _unb64(team_b64).decode()
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(f"{team_b64}.{expires_s}")):
+            return None
+        if now >= expires:
+            return None
+
+        with self._lock:
+            if len(self._verified) >= self.cache_size:
+                self._verified.clear()  # cheap reset; entries re-verify on next use
+            self._verified[token] = (team, expires)
+        return team
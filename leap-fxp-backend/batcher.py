@@ -0,0 +1,87 @@
+"""
+Micro-batching queue for model inference.
+
+Request handlers run in FastAPI's thread pool and call ``submit()``, which
+blocks until the result is ready. A single worker thread collects whatever
+arrives within a short window (or until the batch is full), runs it through
+``fn`` as one batch and hands each result back to the waiting caller.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import eventlog
+import metrics
+
+BATCH_SIZE = metrics.histogram(
+    "batch_size", "Items per micro-batch.", ("batcher",), buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+BATCH_SECONDS = metrics.histogram("batch_seconds", "Time spent running one micro-batch.", ("batcher",))
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch_size: int = 16, max_wait_ms: float = 10.0, name: str = "batcher"):
+        # fn(list_of_items) -> list_of_results, same length and order
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item, timeout: float | None = None):
+        """Queue one item and wait for its result (re-raises the batch's error)."""
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut.result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            BATCH_SIZE.observe(len(items), batcher=self.name)
+            start = time.perf_counter()
+            try:
+                with BATCH_SECONDS.time(batcher=self.name):
+                    results = list(self.fn(items))
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+            except Exception as e:
+                eventlog.event("batch.error", logging.WARNING, batcher=self.name, size=len(items), error=repr(e))
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            eventlog.debug("batch", batcher=self.name, size=len(items),
+                           ms=round((time.perf_counter() - start) * 1000, 2))
+
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
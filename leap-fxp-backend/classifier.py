@@ -1,32 +1,440 @@
-# Use a pipeline as a high-level helper
+# Pixel Fog classifier
+#
+# Nothing is loaded at import time: the model registry pulls the processor and
+# weights on first use (or from the warm-up at server startup) and every
+# caller shares that single copy.
+#
+# CLASSIFIER_BACKEND picks how the forward pass runs on CPU:
+#   torch  - the fp32 transformers model (default)
+#   int8   - the same model with dynamic int8 quantization of its Linear layers
+#   onnx   - exported once to CLASSIFIER_ONNX_PATH and served by ONNX Runtime
+#            (needs the optional onnx + onnxruntime packages, see requirements-cpu.txt)
+#   stub   - no model at all: random logits after CLASSIFIER_STUB_MS of sleep,
+#            for load tests on machines without the weights (see loadtest.py)
+#
+# Parity check against the torch path on the round images:
+#   python classifier.py --parity onnx
 
-from transformers import pipeline
+import os
+import sys
+import threading
+import time
 
-pipe = pipeline("image-classification", model="imzynoxprince/pokemons-image-classifier-gen1-gen9")
-pipe("https://huggingface.co/datasets/huggingface/documentation-images/resolve/main/hub/parrots.png")
+import metrics
 
-# Load model directly
-from transformers import AutoImageProcessor, AutoModelForImageClassification
+MODEL_ID = os.getenv("CLASSIFIER_MODEL", "imzynoxprince/pokemons-image-classifier-gen1-gen9")
+LABELS_PATH = os.getenv("CLASSIFIER_LABELS", "labels.txt")
+BACKEND = os.getenv("CLASSIFIER_BACKEND", "torch").lower()
+ONNX_PATH = os.getenv("CLASSIFIER_ONNX_PATH", "models/classifier.onnx")
+# Intra-op threads for the forward pass; 0 = the library default (all cores).
+# gunicorn.conf.py splits the cores between workers through configure_threads().
+THREADS = int(os.getenv("CLASSIFIER_THREADS", "0"))
 
-processor = AutoImageProcessor.from_pretrained("imzynoxprince/pokemons-image-classifier-gen1-gen9")
-model = AutoModelForImageClassification.from_pretrained("imzynoxprince/pokemons-image-classifier-gen1-gen9")    
+BACKENDS = ("torch", "int8", "onnx", "stub")
 
-from transformers import pipeline
-from PIL import Image
+INFERENCE_SECONDS = metrics.histogram(
+    "classifier_inference_seconds", "Forward pass time per batch.", ("backend",)
+)
+INFERENCE_IMAGES = metrics.counter("classifier_images_total", "Images run through the classifier.", ("backend",))
 
-clf = pipeline("image-classification", model="imzynoxprince/pokemons-image-classifier-gen1-gen9")
 
-def predict(img, number):
-    preds = clf(img)
-    with open('labels.txt', 'r') as file:
-        data = file.read()
-        names = data.split('\n')
-        print(names)
-        ans = names[number]
-        for p in preds:
-            print(p)
-        print(ans, preds[number]['label'])
-        if preds[number]['label'] == ans:
-            return False
+def _timed(runner, backend: str):
+    def run(pixel_values):
+        with INFERENCE_SECONDS.time(backend=backend):
+            logits = runner(pixel_values)
+        INFERENCE_IMAGES.inc(len(pixel_values), backend=backend)
+        return logits
+    return run
+
+
+def configure_threads(n: int):
+    """Set the intra-op thread count for this process (before the first inference)."""
+    global THREADS
+    THREADS = n
+    if registry.backend in ("torch", "int8"):
+        import torch
+
+        torch.set_num_threads(max(1, n))
+
+
+def _torch_runner(model):
+    import torch
+
+    if THREADS:
+        torch.set_num_threads(THREADS)
+
+    def run(pixel_values):
+        with torch.no_grad():
+            return model(pixel_values=torch.from_numpy(pixel_values)).logits.numpy()
+    return run
+
+
+def _export_onnx(model, path: str):
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, pixel_values):
+            return self.inner(pixel_values=pixel_values).logits
+
+    size = getattr(model.config, "image_size", 224)
+    channels = getattr(model.config, "num_channels", 3)
+    dummy = torch.zeros(1, channels, size, size)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Per process: gunicorn workers warming up together may all export at once;
+    # each writes its own file and the atomic replace lets the last one win
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        torch.onnx.export(
+            LogitsOnly(model).eval(),
+            (dummy,),
+            tmp,
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+            dynamo=False,
+        )
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _onnx_runner(model, path: str):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("CLASSIFIER_BACKEND=onnx needs the onnxruntime package") from e
+
+    if not os.path.exists(path):
+        _export_onnx(model, path)
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if THREADS:
+        opts.intra_op_num_threads = THREADS
+    session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+
+    def run(pixel_values):
+        return session.run(["logits"], {"pixel_values": pixel_values})[0]
+    return run
+
+
+class ModelRegistry:
+    """Owns the one shared image processor + model for this process."""
+
+    def __init__(self, model_id: str, backend: str = "torch"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown classifier backend {backend!r}, expected one of {BACKENDS}")
+        self.model_id = model_id
+        self.backend = backend
+        self.state = "cold"  # cold -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+        self.label2id = {}
+        self._processor = None
+        self._runner = None
+        self._spec = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        """
+        Return (processor, runner), loading them on the first call.
+        runner(pixel_values: float32 ndarray) -> logits ndarray, whatever the backend.
+        """
+        if self._runner is not None:
+            return self._processor, self._runner
+
+        with self._lock:
+            if self._runner is None:
+                self.state = "loading"
+                self.error = None
+                start = time.perf_counter()
+                try:
+                    processor, runner, label2id = self._build()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.label2id = label2id
+                self._spec = _spec_from(processor)
+                self._processor, self._runner = processor, _timed(runner, self.backend)
+                self.load_seconds = round(time.perf_counter() - start, 3)
+                self.state = "ready"
+
+        return self._processor, self._runner
+
+    def _build(self):
+        if self.backend == "stub":
+            return _stub_build()
+
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        processor = AutoImageProcessor.from_pretrained(self.model_id)
+        model = AutoModelForImageClassification.from_pretrained(self.model_id)
+        model.eval()
+        label2id = {label: int(i) for i, label in model.config.id2label.items()}
+
+        if self.backend == "int8":
+            import torch
+
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            runner = _torch_runner(model)
+        elif self.backend == "onnx":
+            runner = _onnx_runner(model, ONNX_PATH)
+            del model  # ONNX Runtime holds its own copy; let the torch weights go
         else:
-            return True
+            runner = _torch_runner(model)
+
+        return processor, runner, label2id
+
+    def preprocess_spec(self) -> dict | None:
+        """
+        Plain resize/rescale/normalize settings of the processor, so the
+        preprocessing can run outside this process (see preprocess.py).
+        None if the processor does something else (e.g. center crops).
+        """
+        self.load()
+        return self._spec
+
+    def status(self) -> dict:
+        return {
+            "model": self.model_id,
+            "backend": self.backend,
+            "state": self.state,
+            "ready": self.ready,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+class _StubProcessor:
+    """ViT-style preprocessing settings; only read through _spec_from()."""
+
+    do_resize = do_rescale = do_normalize = True
+    do_center_crop = False
+    size = {"height": 224, "width": 224}
+    resample = 2  # bilinear
+    rescale_factor = 1 / 255
+    image_mean = image_std = [0.5, 0.5, 0.5]
+
+    def __call__(self, images, return_tensors="np"):
+        import numpy as np
+        from preprocess import to_pixels
+
+        spec = _spec_from(self)
+        return {"pixel_values": np.stack([to_pixels(img, spec) for img in images])}
+
+
+def _stub_build():
+    import numpy as np
+
+    delay = float(os.getenv("CLASSIFIER_STUB_MS", "20")) / 1000.0
+    names = labels.names() if os.path.exists(labels.path) else []
+    label2id = {name: i for i, name in enumerate(dict.fromkeys(n for n in names if n))}
+    num_classes = max(len(label2id), len(names), 16)  # every rank a round can ask for exists
+    rng = np.random.default_rng()
+
+    def run(pixel_values):
+        time.sleep(delay)
+        return rng.standard_normal((len(pixel_values), num_classes)).astype("float32")
+    return _StubProcessor(), run, label2id
+
+
+def _spec_from(processor) -> dict | None:
+    size = getattr(processor, "size", None)
+    if (
+        not getattr(processor, "do_resize", False)
+        or getattr(processor, "do_center_crop", False)
+        or not getattr(processor, "do_rescale", False)
+        or not getattr(processor, "do_normalize", False)
+    ):
+        return None
+    try:
+        height, width = int(size["height"]), int(size["width"])
+    except (KeyError, TypeError):
+        return None  # shortest_edge style sizes keep the aspect ratio; leave those to the processor
+
+    try:
+        resample = int(getattr(processor, "resample", 2))
+    except (TypeError, ValueError):
+        resample = 2  # fast (torchvision) processors use InterpolationMode; PIL bilinear is the closest
+    return {
+        "size": (height, width),
+        "resample": resample,
+        "rescale": float(processor.rescale_factor),
+        "mean": [float(m) for m in processor.image_mean],
+        "std": [float(s) for s in processor.image_std],
+    }
+
+
+class LabelIndex:
+    """
+    Expected label per round image (line N of labels.txt is image N).
+    The file is only re-read when its mtime changes, so organizers can edit
+    it mid-event without a restart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._names: list[str] = []
+        self._ids: list[int] | None = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path, 'r') as file:
+                    self._names = [name.strip() for name in file.read().split('\n')]
+                self._ids = None
+                self._mtime = mtime
+
+    def version(self):
+        """Changes whenever the file is re-read; lets callers invalidate cached results."""
+        self._refresh()
+        return self._mtime
+
+    def names(self) -> list[str]:
+        self._refresh()
+        return self._names
+
+    def ids(self, label2id: dict) -> list[int]:
+        """Model class id for each line; -1 if the model has no such label."""
+        self._refresh()
+        ids = self._ids
+        if ids is None:
+            ids = [label2id.get(name, -1) for name in self._names]
+            self._ids = ids
+        return ids
+
+
+registry = ModelRegistry(MODEL_ID, BACKEND)
+labels = LabelIndex(LABELS_PATH)
+
+
+def pixels_for(images, reg: ModelRegistry = None):
+    """Preprocess a batch of PIL images with the model's own processor -> float32 (N, C, H, W)."""
+    processor, _ = (reg or registry).load()
+    rgb = [img if img.mode == "RGB" else img.convert("RGB") for img in images]
+    pixel_values = processor(images=rgb, return_tensors="np")["pixel_values"]
+    return pixel_values.astype("float32", copy=False)
+
+
+def logits_for(images, reg: ModelRegistry = None):
+    """Run a batch of PIL images through the model and return the logits array."""
+    _, runner = (reg or registry).load()
+    return runner(pixels_for(images, reg))
+
+
+def predict_batch(images, numbers):
+    """
+    Batched predict(): one forward pass for several submissions.
+    Returns a list of booleans (True = the classifier was fooled, i.e. the
+    prediction at rank ``number`` is no longer the expected label).
+    """
+    return _fooled(logits_for(images), numbers)
+
+
+def score_pixels(pixels, numbers):
+    """
+    predict_batch() for submissions that were already preprocessed: ``pixels``
+    is a list of float32 (C, H, W) arrays as produced by preprocess.to_pixels().
+    Returns (fooled, margin) per submission, see margins().
+    """
+    import numpy as np
+
+    _, runner = registry.load()
+    logits = runner(np.stack(pixels))
+    return list(zip(_fooled(logits, numbers), margins(logits, numbers)))
+
+
+def margins(logits, numbers):
+    """
+    How far each row is from flipping its _fooled() verdict. That verdict
+    checks the expected label at rank ``number``, so with the other labels
+    ranked on their own, this is the smaller of the expected logit's gaps to
+    the ones at rank number - 1 (above) and number (below). Positive means
+    the model still puts the expected label at that rank (not fooled); the
+    closer to zero, the closer the image is to flipping it. None if the label
+    isn't in the model.
+    """
+    import numpy as np
+
+    expected_ids = labels.ids(registry.label2id)
+    expected = np.array([expected_ids[n] for n in numbers])
+    ranks = np.array(numbers)
+    rows = np.arange(len(expected))
+    valid = expected >= 0
+
+    target = logits[rows, np.where(valid, expected, 0)]
+    others = logits.copy()
+    others[rows[valid], expected[valid]] = -np.inf
+    others = np.sort(others, axis=-1)[:, ::-1]  # descending; the expected label's -inf ends up last
+    below = target - others[rows, np.minimum(ranks, others.shape[-1] - 1)]
+    above = np.where(ranks > 0, others[rows, np.maximum(ranks - 1, 0)] - target, np.inf)
+    margin = np.minimum(above, below)
+    return [round(float(m), 4) if ok else None for m, ok in zip(margin, valid)]
+
+
+def _fooled(logits, numbers):
+    import numpy as np
+
+    expected = labels.ids(registry.label2id)
+
+    # Same ordering the pipeline uses (softmax is monotonic, so rank the logits)
+    ranked = np.argsort(-logits, axis=-1, kind="stable")
+    return [int(row[number]) != expected[number] for row, number in zip(ranked, numbers)]
+
+def predict(img, number):
+    return predict_batch([img], [number])[0]
+
+
+def _parity(backend: str, folder: str = "uploads") -> int:
+    """Compare top-1 labels of ``backend`` against the torch path; returns mismatches."""
+    import numpy as np
+    from PIL import Image
+
+    files = sorted(f for f in os.listdir(folder) if not f.startswith("."))
+    images = [Image.open(os.path.join(folder, f)).convert("RGB") for f in files]
+
+    reference = ModelRegistry(MODEL_ID, "torch")
+    candidate = ModelRegistry(MODEL_ID, backend)
+    reference.load()
+    candidate.load()  # load/export up front so it isn't counted in the timings
+    id2label = {i: label for label, i in reference.label2id.items()}
+
+    mismatches = 0
+    for name, image in zip(files, images):
+        ref_start = time.perf_counter()
+        ref = int(np.argmax(logits_for([image], reference)[0]))
+        ref_ms = (time.perf_counter() - ref_start) * 1000
+        cand_start = time.perf_counter()
+        cand = int(np.argmax(logits_for([image], candidate)[0]))
+        cand_ms = (time.perf_counter() - cand_start) * 1000
+
+        ok = ref == cand
+        mismatches += not ok
+        print(f"{'OK  ' if ok else 'DIFF'} {name}: torch={id2label[ref]} ({ref_ms:.1f} ms) "
+              f"{backend}={id2label[cand]} ({cand_ms:.1f} ms)")
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--parity":
+        sys.exit(1 if _parity(sys.argv[2]) else 0)
+    print("usage: python classifier.py --parity {int8,onnx}")
@@ -0,0 +1,133 @@
+"""
+Structured event log: one JSON object per line in a rotating file.
+
+Request handlers never touch the file. event() puts the record on a bounded
+in-memory queue (a full queue drops the record and counts it instead of
+blocking) and a QueueListener thread formats and writes it. start() /
+stop() run that thread; until start() events are discarded.
+
+Every line carries the request context the HTTP middleware sets up with
+request_context(): request_id, method, route, plus whatever handlers add
+with bind() (team, outcome, ...). Together with the per-request "request"
+line (status, latency) the log is a replayable record of the event.
+
+    event("pixelfog.submit", team="team3", image=1, changed=12, fooled=True)
+    debug("classifier.batch", size=7)   # only with EVENT_LOG_LEVEL=DEBUG, sampled
+
+DEBUG events are kept with probability ``debug_sample`` so they can stay on
+during the event without flooding the file.
+
+With several worker processes use a ``{pid}`` placeholder in the path (the
+gunicorn config does) so each process rotates its own file.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+import metrics
+
+LOGGER_NAME = "beatleap.events"
+
+DROPPED = metrics.counter("event_log_dropped_total", "Event log records dropped because the queue was full.")
+
+_context: contextvars.ContextVar[dict | None] = contextvars.ContextVar("event_context", default=None)
+_logger = logging.getLogger(LOGGER_NAME)
+_logger.propagate = False
+_listener = None
+
+
+def request_context(**fields) -> dict:
+    """Start a fresh context for this request; the returned dict is shared with every handler thread/task."""
+    ctx = dict(fields)
+    _context.set(ctx)
+    return ctx
+
+
+def bind(**fields):
+    """Add fields (team, outcome, ...) to the current request's context."""
+    ctx = _context.get()
+    if ctx is not None:
+        ctx.update(fields)
+
+
+def event(name: str, level: int = logging.INFO, **fields):
+    if _logger.isEnabledFor(level):
+        _logger.log(level, name, extra={"fields": fields})
+
+
+def debug(name: str, **fields):
+    event(name, logging.DEBUG, **fields)
+
+
+class _ContextFilter(logging.Filter):
+    """Runs in the calling thread: snapshot the request context and sample DEBUG records."""
+
+    def __init__(self, debug_sample: float):
+        super().__init__()
+        self.debug_sample = debug_sample
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample:
+            return False
+        ctx = _context.get()
+        record.ctx = dict(ctx) if ctx else {}
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "pid": record.process,
+        }
+        line.update(getattr(record, "ctx", {}))
+        line.update(getattr(record, "fields", {}))
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+def start(path: str, level: str = "INFO", max_bytes: int = 50 * 1024 * 1024, backups: int = 10,
+          debug_sample: float = 0.01, queue_size: int = 10000):
+    """Attach the queue handler and start the writer thread (in the serving process, after any fork)."""
+    global _listener
+    if _listener is not None:
+        return
+    path = path.format(pid=os.getpid())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                        encoding="utf-8", delay=True)
+    file_handler.setFormatter(JsonFormatter())
+
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(_ContextFilter(debug_sample))
+    _logger.handlers[:] = [handler]
+    _logger.setLevel(level.upper())
+    _listener = logging.handlers.QueueListener(handler.queue, file_handler)
+    _listener.start()
+
+
+def stop():
+    """Write out what is still queued and close the file."""
+    global _listener
+    if _listener is None:
+        return
+    _logger.handlers.clear()
+    _listener.stop()
+    for h in _listener.handlers:
+        h.close()
+    _listener = None
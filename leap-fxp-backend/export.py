@@ -0,0 +1,84 @@
+"""
+Streamed zip / tar archives of files on disk.
+
+Both generators read each file in fixed-size chunks and yield archive bytes
+as they go, so memory stays constant no matter how many submissions there
+are and nothing is written to disk first. Use them as the body of a
+StreamingResponse.
+
+``entries`` is an iterable of (name_in_archive, path_on_disk).
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+CHUNK_SIZE = 256 * 1024
+
+# Already-compressed formats are stored as-is; deflating them only burns CPU
+_STORED = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif"}
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer that hands back what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    sink = _Sink()
+    # A non-seekable target makes zipfile use data descriptors, so each
+    # member can be written without knowing its CRC up front
+    with zipfile.ZipFile(sink, "w") as zf:
+        for arcname, path in entries:
+            st = os.stat(path)
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            suffix = os.path.splitext(path)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if suffix in _STORED else zipfile.ZIP_DEFLATED
+
+            with open(path, "rb") as src, zf.open(info, "w", force_zip64=st.st_size >= zipfile.ZIP64_LIMIT) as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    dst.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_tar(entries):
+    for arcname, path in entries:
+        st = os.stat(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = st.st_size
+        info.mtime = int(st.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(tarfile.PAX_FORMAT)
+
+        with open(path, "rb") as src:
+            while chunk := src.read(CHUNK_SIZE):
+                yield chunk
+
+        remainder = st.st_size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # End-of-archive marker: two empty blocks
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
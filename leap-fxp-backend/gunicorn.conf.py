@@ -0,0 +1,90 @@
+"""
+Multi-worker deployment: gunicorn pre-fork with uvicorn workers.
+
+    STATE_BACKEND=sqlite:///event.db WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py test_wrappers:app
+
+The app is imported once in the master (preload_app). For the torch and int8
+classifier backends the weights are loaded there as well, before the first
+fork, so every worker shares those pages copy-on-write instead of holding its
+own copy. gc.freeze() keeps the collector from touching (and so copying) the
+objects created up to that point.
+
+The worker count comes from WEB_CONCURRENCY (default 2) and nowhere else;
+-w/--workers is refused. The app divides GEMINI_RPM by it, and cores are
+split between workers so they don't oversubscribe the machine: each gets
+CLASSIFIER_THREADS intra-op threads (default cores / workers) and
+PIXELFOG_DECODE_WORKERS decode processes (default cores / (2 * workers)).
+The master itself runs no inference: thread pools created there wouldn't
+survive the fork.
+
+ONNX Runtime sessions can't be shared across fork, so with
+CLASSIFIER_BACKEND=onnx each worker builds its own during its warm-up.
+
+Several workers need a shared STATE_BACKEND (sqlite:///...); scores,
+completions and Interrogation Room stages live there. The per-worker startup
+warm-up still runs and /ready gates each worker separately.
+
+Each worker writes its own event log (EVENT_LOG_PATH defaults to
+logs/events-{pid}.jsonl here); see eventlog.py.
+"""
+
+import gc
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()  # same .env the app reads, so the checks below see it
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))  # first requests may wait for the warm-up
+graceful_timeout = 30
+keepalive = 5
+
+_cores = os.cpu_count() or 1
+_threads = int(os.getenv("CLASSIFIER_THREADS", "0")) or max(1, _cores // workers)
+# Read when the app module is imported, i.e. after this file
+os.environ.setdefault("WEB_CONCURRENCY", str(workers))  # each worker's share of GEMINI_RPM
+os.environ.setdefault("PIXELFOG_DECODE_WORKERS", str(max(1, _cores // (2 * workers))))
+# One event log file per worker; RotatingFileHandler can't share a file between processes
+os.environ.setdefault("EVENT_LOG_PATH", "logs/events-{pid}.jsonl")
+
+if workers > 1 and os.getenv("STATE_BACKEND", "memory").strip() == "memory":
+    raise RuntimeError(
+        "STATE_BACKEND=memory keeps scores per process; use sqlite:///path.db with several workers"
+    )
+
+
+def when_ready(server):
+    """In the master, after the app was imported and before any worker is forked."""
+    import classifier
+
+    if server.cfg.workers != workers:
+        # The app already split the Gemini quota and the cores by `workers`
+        raise RuntimeError(
+            f"started with {server.cfg.workers} workers but configured for {workers}; "
+            "set WEB_CONCURRENCY instead of passing -w/--workers"
+        )
+
+    classifier.configure_threads(1)
+    if classifier.registry.backend in ("torch", "int8"):
+        try:
+            classifier.registry.load()
+        except Exception:
+            # Not fatal: each worker retries the load during its own warm-up
+            server.log.exception("preloading the classifier in the master failed")
+        else:
+            server.log.info(
+                "classifier %s (%s) loaded in the master in %ss",
+                classifier.registry.model_id, classifier.registry.backend, classifier.registry.load_seconds,
+            )
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import classifier
+
+    classifier.configure_threads(_threads)
+    server.log.info("worker %s: %d classifier threads", worker.pid, _threads)
@@ -0,0 +1,193 @@
+"""
+In-memory store for the Pixel Fog round images.
+
+The images in uploads/ don't change during a round, so they are read once,
+sorted by their leading number ("1.jpeg", "2.jpeg", ...) and kept in memory
+together with a pre-encoded data URL and an ETag. Call reload() (or enable
+watch()) when organizers swap the files.
+
+image_response() turns a stored image into a cacheable binary response
+(ETag / If-None-Match, Cache-Control, single byte ranges), and mirror_urls()
+downloads remote images into a folder so they can be served the same way.
+"""
+
+import base64
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+_NUM = re.compile(r"(\d+)")
+_WHOLE = object()  # _parse_range(): ignore the Range header, send everything
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    name: str
+    mime: str
+    data: bytes
+    etag: str
+    data_url: str
+
+
+def _extract_num(name: str) -> int:
+    match = _NUM.match(name)
+    return int(match.group(1)) if match else -1
+
+
+class ImageStore:
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._images: list[StoredImage] = []
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def reload(self) -> int:
+        """Re-read every image in the folder; returns how many were loaded."""
+        files = [
+            f for f in os.listdir(self.folder)
+            if not f.startswith(".") and os.path.isfile(os.path.join(self.folder, f))
+        ]
+        files.sort(key=_extract_num)
+
+        images = []
+        for name in files:
+            with open(os.path.join(self.folder, name), "rb") as f:
+                data = f.read()
+            mime = mimetypes.guess_type(name)[0] or "image/jpeg"
+            encoded = base64.b64encode(data).decode("utf-8")
+            images.append(StoredImage(
+                name=name,
+                mime=mime,
+                data=data,
+                etag=f'"{hashlib.sha1(data).hexdigest()}"',
+                data_url=f"data:{mime};base64,{encoded}",
+            ))
+
+        with self._lock:
+            self._images = images
+            self._loaded = True
+        return len(images)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.reload()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._images)
+
+    def get(self, index: int) -> StoredImage:
+        """Image at ``index`` in numeric order (IndexError if out of range)."""
+        self._ensure_loaded()
+        return self._images[index]
+
+    def find(self, number: int) -> StoredImage | None:
+        """Image whose filename starts with ``number`` (e.g. 3 -> "3.jpg"), if any."""
+        self._ensure_loaded()
+        for image in self._images:
+            if _extract_num(image.name) == number:
+                return image
+        return None
+
+    def watch(self):
+        """Reload automatically when files in the folder change (uses watchfiles)."""
+        from watchfiles import watch
+
+        def run():
+            for _ in watch(self.folder, stop_event=self._stop):
+                try:
+                    self.reload()
+                except OSError:
+                    pass  # file mid-write; the next change event reloads again
+
+        threading.Thread(target=run, name="image-store-watch", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _parse_range(header: str, size: int):
+    """
+    Parse a single "bytes=start-end" range. Returns (start, end) inclusive,
+    None if unsatisfiable, or _WHOLE if the header should be ignored (malformed
+    or multi-range; serving the whole body is always allowed).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return _WHOLE
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return None
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return _WHOLE
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def image_response(image: StoredImage, range_header: str = None, if_none_match: str = None,
+                   max_age: int = 300):
+    """Binary response for ``image`` honoring conditional and range requests."""
+    from fastapi import Response
+
+    headers = {
+        "ETag": image.etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        if "*" in tags or image.etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    size = len(image.data)
+    span = _parse_range(range_header, size) if range_header else _WHOLE
+    if span is None:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if span is not _WHOLE:
+        start, end = span
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(image.data[start:end + 1], status_code=206, media_type=image.mime, headers=headers)
+
+    return Response(image.data, media_type=image.mime, headers=headers)
+
+
+def mirror_urls(urls: list[str], folder: str, timeout: float = 20.0) -> int:
+    """
+    Download each URL to <folder>/<index><ext>, skipping files already there.
+    Failures are left for the next run; returns how many files were fetched.
+    """
+    import httpx
+
+    os.makedirs(folder, exist_ok=True)
+    fetched = 0
+    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
+        for i, url in enumerate(urls):
+            ext = os.path.splitext(urlparse(url).path)[1].lower() or ".jpg"
+            dest = os.path.join(folder, f"{i}{ext}")
+            if os.path.exists(dest):
+                continue
+            try:
+                resp = client.get(url)
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                continue
+
+            tmp = os.path.join(folder, f".{i}{ext}.part")  # dotfiles are skipped by reload()
+            with open(tmp, "wb") as f:
+                f.write(resp.content)
+            os.replace(tmp, dest)
+            fetched += 1
+    return fetched
@@ -0,0 +1,97 @@
+"""
+Live game-status / leaderboard feed for WebSocket clients.
+
+One background task per worker takes a snapshot of the event state (via
+``snapshot_fn``) whenever notify() is called, or every ``interval`` seconds
+to pick up changes made by other workers, and fans the diff out to every
+connected client. Each message is serialized once and put on a small
+per-client queue; a client that falls behind gets its queue replaced by a
+fresh snapshot instead of slowing everyone else down.
+
+Messages:
+  {"type": "snapshot", "games": {...}, "scores": {...}}   on connect / resync
+  {"type": "diff", "games": {...}, "scores": {...}}       only changed keys
+"""
+
+import asyncio
+import json
+
+
+class LiveFeed:
+    def __init__(self, snapshot_fn, interval: float = 1.0, queue_size: int = 32):
+        # snapshot_fn() -> {"games": {...}, "scores": {...}}; may block, runs in a thread
+        self.snapshot_fn = snapshot_fn
+        self.interval = interval
+        self.queue_size = queue_size
+        self._clients: set[asyncio.Queue] = set()
+        self._last: dict = {}
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._last = await asyncio.to_thread(self.snapshot_fn)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def notify(self):
+        """Something changed; safe to call from request threads."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(self._snapshot_message())
+        self._clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _snapshot_message(self) -> str:
+        return json.dumps({"type": "snapshot", **self._last})
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                current = await asyncio.to_thread(self.snapshot_fn)
+            except Exception:
+                continue  # transient backend error; try again next round
+
+            diff = {}
+            for section, values in current.items():
+                previous = self._last.get(section, {})
+                changed = {k: v for k, v in values.items() if previous.get(k) != v}
+                if changed:
+                    diff[section] = changed
+            self._last = current
+            if diff:
+                self._publish(json.dumps({"type": "diff", **diff}))
+
+    def _publish(self, message: str):
+        for queue in list(self._clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too slow to keep up with diffs: drop its backlog and resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_message())
@@ -0,0 +1,480 @@
+"""
+Load test / benchmark for the event backend.
+
+Starts a local stand-in for the Gemini API and test_wrappers:app under
+uvicorn, then replays a mix of traffic from N teams (log in, poll game
+status and scores, ask the oracle plain and streamed, fetch and submit Pixel
+Fog grids, upload Story Hunt photos) for a fixed duration and prints
+throughput and p50/p95/p99 latency per endpoint.
+
+    python loadtest.py                                   # 16 teams, 60 s, stub classifier
+    python loadtest.py --teams 32 --duration 120 --classifier torch
+    python loadtest.py --gemini-latency-ms 1500 --gemini-error-rate 0.05
+    python loadtest.py --url http://127.0.0.1:8000       # an already running backend
+    python loadtest.py --json results.json --max-p95-ms 500 --max-error-rate 0.01
+
+The classifier defaults to CLASSIFIER_BACKEND=stub (random logits after
+--stub-ms of sleep) so the run doesn't need the weights; pass --classifier
+torch/int8/onnx to measure the real model. Uploads go to a temporary
+directory and state is in memory (or a temporary SQLite file with
+--workers > 1), so nothing from the run is left behind. With the
+thresholds set, the exit code is 1 when a run regresses past them. Server
+side numbers (batch sizes, inference and Gemini time) are on /metrics.
+
+The fake Gemini server can also be run on its own:
+
+    python loadtest.py --fake-gemini 9100 --gemini-latency-ms 800
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Same credentials as the teams table in test_wrappers.py
+TEAM_PASSWORDS = {
+    "team1": "4827", "team2": "1904", "team3": "7532", "team4": "6289",
+    "team5": "3178", "team6": "9406", "team7": "5521", "team8": "8640",
+    "team9": "7315", "team10": "2958", "team11": "4763", "team12": "8091",
+    "team13": "6654", "team14": "1387", "team15": "9275", "team16": "5048",
+}
+
+QUESTIONS = [
+    "Is it a living thing?", "Is it bigger than a car?", "Can you eat it?",
+    "Is it found indoors?", "Is it made of metal?", "Does it have legs?",
+    "Is it used for work?", "Is it older than 100 years?", "Is it an animal?",
+]
+
+# Relative weight of each action in a team's loop; roughly what the
+# frontend does during a round (status is polled far more than anything else)
+MIX = {
+    "status": 30,
+    "scores": 10,
+    "ask": 12,
+    "ask_stream": 8,
+    "pixelfog_image": 10,
+    "pixelfog_submit": 25,
+    "upload": 5,
+}
+
+
+# ---------------------------------------------------------------------------
+# Fake Gemini
+# ---------------------------------------------------------------------------
+
+def fake_gemini_app(latency_ms: float, error_rate: float, chunks: int = 3):
+    """
+    Just enough of the generateContent / streamGenerateContent REST API for
+    google-genai. Each call waits latency_ms (+-50 %) and fails with a 503
+    with probability error_rate.
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    answers = ["Yes.", "No.", "Maybe, think about where you'd find it.", "No, but you're close."]
+
+    def delay() -> float:
+        return max(0.0, latency_ms / 1000.0 * random.uniform(0.5, 1.5))
+
+    def body(text: str, model: str) -> dict:
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "modelVersion": model,
+        }
+
+    def unavailable():
+        return JSONResponse(
+            {"error": {"code": 503, "message": "fake overload", "status": "UNAVAILABLE"}},
+            status_code=503,
+        )
+
+    @app.get("/{version}/models/{model}")
+    async def get_model(version: str, model: str):
+        # OracleClient.warm_up() at server startup
+        return {"name": f"models/{model}", "displayName": "fake", "inputTokenLimit": 1048576}
+
+    @app.post("/{version}/models/{call:path}")
+    async def generate(version: str, call: str, request: Request):
+        model, _, method = call.partition(":")
+        await request.body()
+        if random.random() < error_rate:
+            await asyncio.sleep(delay() / 4)
+            return unavailable()
+
+        text = random.choice(answers)
+        if method == "generateContent":
+            await asyncio.sleep(delay())
+            return body(text, model)
+
+        step = max(1, math.ceil(len(text) / chunks))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        total = delay()
+
+        async def events():
+            for piece in pieces:
+                await asyncio.sleep(total / len(pieces))
+                yield f"data: {json.dumps(body(piece, model))}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def serve_fake_gemini(port: int, latency_ms: float, error_rate: float):
+    import uvicorn
+
+    uvicorn.run(fake_gemini_app(latency_ms, error_rate), host="127.0.0.1", port=port, log_level="warning")
+
+
+# ---------------------------------------------------------------------------
+# Servers
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_servers(args, workdir: str):
+    """Fake Gemini + backend subprocesses; returns (base_url, [processes])."""
+    gemini_port, app_port = _free_port(), _free_port()
+    procs = [subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--fake-gemini", str(gemini_port),
+        "--gemini-latency-ms", str(args.gemini_latency_ms),
+        "--gemini-error-rate", str(args.gemini_error_rate),
+    ])]
+
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "loadtest",
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{gemini_port}",
+        "CLASSIFIER_BACKEND": args.classifier,
+        "CLASSIFIER_STUB_MS": str(args.stub_ms),
+        "STORY_UPLOAD_DIR": os.path.join(workdir, "downloads"),
+        "STATE_BACKEND": "memory" if args.workers == 1 else f"sqlite:///{os.path.join(workdir, 'state.db')}",
+    })
+    if args.workers > 1:
+        # The pre-fork deployment mode (shared weights, split threads)
+        env.update({"WEB_CONCURRENCY": str(args.workers), "BIND": f"127.0.0.1:{app_port}"})
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning",
+                   "test_wrappers:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "test_wrappers:app", "--host", "127.0.0.1",
+                   "--port", str(app_port), "--log-level", "warning"]
+    procs.append(subprocess.Popen(command, cwd=HERE, env=env))
+    return f"http://127.0.0.1:{app_port}", procs
+
+
+def stop_servers(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def wait_ready(base_url: str, timeout: float) -> dict:
+    """Poll /ready until the backend finished warming up; returns /health."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        try:
+            r = httpx.get(f"{base_url}/ready", timeout=2)
+            last = r.json()
+            if r.status_code == 200:
+                return httpx.get(f"{base_url}/health", timeout=2).json()
+            failed = {k: v for k, v in last["checks"].items() if v.startswith("failed")}
+            if failed.get("classifier") or failed.get("assets"):
+                raise RuntimeError(f"warm-up failed: {failed}")
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"backend at {base_url} not ready after {timeout:.0f}s (last /ready: {last})")
+
+
+# ---------------------------------------------------------------------------
+# Load
+# ---------------------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)  # endpoint -> [ms]
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, ms: float, status, ok: bool):
+        self.latency[endpoint].append(ms)
+        self.statuses[endpoint][status] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> dict:
+        rows = {}
+        for endpoint in sorted(self.latency):
+            values = sorted(self.latency[endpoint])
+            rows[endpoint] = {
+                "count": len(values),
+                "errors": self.errors[endpoint],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 0.50), 1),
+                "p95_ms": round(_percentile(values, 0.95), 1),
+                "p99_ms": round(_percentile(values, 0.99), 1),
+                "max_ms": round(values[-1], 1),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[endpoint].items(), key=str)},
+            }
+        return rows
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(q * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def make_grids(count: int, size: int = 224, seed: int = 0) -> list[str]:
+    """PNG data URLs of random colour grids, like the Pixel Fog editor sends."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    cells = 16
+    grids = []
+    for _ in range(count):
+        small = Image.new("RGB", (cells, cells))
+        small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(cells * cells)])
+        buf = io.BytesIO()
+        small.resize((size, size), Image.NEAREST).save(buf, "PNG")
+        grids.append("data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii"))
+    return grids
+
+
+def make_photo(seed: int, size=(1280, 960)) -> bytes:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+class Team:
+    def __init__(self, name: str, password: str, grids: list[str], photo: bytes, rng: random.Random):
+        self.name = name
+        self.password = password
+        self.grids = grids
+        self.photo = photo
+        self.rng = rng
+        self.token = None
+        self.session = None
+        self.uploaded = False
+
+    async def timed(self, stats: Stats, endpoint: str, request, ok_statuses=(200,)):
+        start = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        stats.record(endpoint, (time.perf_counter() - start) * 1000, status, status in ok_statuses)
+        return response
+
+    async def login(self, client: httpx.AsyncClient, stats: Stats) -> bool:
+        r = await self.timed(stats, "POST /login", client.post(
+            "/login", json={"team_name": self.name, "password": self.password}))
+        if r is None or r.status_code != 200:
+            return False
+        data = r.json()
+        self.token, self.session = data["token"], data["server_session"]
+        return True
+
+    async def act(self, action: str, client: httpx.AsyncClient, stats: Stats, images: int):
+        if action == "status":
+            await self.timed(stats, "GET /games/status", client.get(
+                "/games/status", headers={"server-session": self.session}))
+        elif action == "scores":
+            await self.timed(stats, "GET /scores", client.get("/scores"))
+        elif action == "ask":
+            # 403 once a team guessed the answer (the fake oracle never says so, but a real one may)
+            await self.timed(stats, "POST /ask", client.post("/ask", json=self._ask()), (200, 403))
+        elif action == "ask_stream":
+            await self._ask_stream(client, stats)
+        elif action == "pixelfog_image":
+            await self.timed(stats, "POST /pixelfog/image", client.post("/pixelfog/image", json={
+                "server_session": self.session, "team_name": self.name,
+                "imageiter": self.rng.randrange(images), "format": "url",
+            }))
+        elif action == "pixelfog_submit":
+            await self.timed(stats, "POST /beatleap/submit", client.post("/beatleap/submit", json={
+                "serversession": self.session, "team_name": self.name, "token": self.token,
+                "image_data": self.rng.choice(self.grids), "imageiter": self.rng.randrange(images),
+                "changed": self.rng.randrange(1, 200),
+            }))
+        elif action == "upload":
+            self.uploaded = True  # the game is done after one upload; later ones only get 403s
+            files = [("files", (f"photo{i}.jpg", self.photo, "image/jpeg")) for i in range(self.rng.randint(1, 3))]
+            await self.timed(stats, "POST /images/upload", client.post("/images/upload", data={
+                "team_name": self.name, "token": self.token, "server_session": self.session,
+            }, files=files), (200, 403))
+
+    def _ask(self) -> dict:
+        return {
+            "team_name": self.name, "token": self.token, "session_id": self.session,
+            "server_session": self.session, "user_input": self.rng.choice(QUESTIONS),
+        }
+
+    async def _ask_stream(self, client: httpx.AsyncClient, stats: Stats):
+        start = time.perf_counter()
+        status, first = None, None
+        try:
+            async with client.stream("POST", "/ask/stream", json=self._ask()) as r:
+                status = r.status_code
+                async for _ in r.aiter_lines():
+                    if first is None:
+                        first = time.perf_counter()
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        end = time.perf_counter()
+        ok = status in (200, 403)
+        stats.record("POST /ask/stream", (end - start) * 1000, status, ok)
+        if first is not None:
+            stats.record("POST /ask/stream (first event)", (first - start) * 1000, status, ok)
+
+    async def run(self, client: httpx.AsyncClient, stats: Stats, stop_at: float, think_ms: float, images: int):
+        # Teams don't all log in in the same millisecond
+        await asyncio.sleep(self.rng.uniform(0, think_ms / 1000.0))
+        if not await self.login(client, stats):
+            return
+        actions = list(MIX)
+        while time.monotonic() < stop_at:
+            weights = [0 if (a == "upload" and self.uploaded) else MIX[a] for a in actions]
+            await self.act(self.rng.choices(actions, weights)[0], client, stats, images)
+            await asyncio.sleep(self.rng.expovariate(1000.0 / think_ms) if think_ms > 0 else 0)
+
+
+async def run_load(base_url: str, args) -> tuple[Stats, float]:
+    stats = Stats()
+    names = list(TEAM_PASSWORDS)
+    teams = []
+    for i in range(args.teams):
+        # more clients than registered teams share a login, like several laptops per team
+        name = names[i % len(names)]
+        rng = random.Random(args.seed + i)
+        teams.append(Team(name, TEAM_PASSWORDS[name], make_grids(args.grids, seed=args.seed + i),
+                          make_photo(args.seed + i), rng))
+
+    limits = httpx.Limits(max_connections=args.teams * 2, max_keepalive_connections=args.teams * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.monotonic()
+        stop_at = start + args.duration
+        await asyncio.gather(*(t.run(client, stats, stop_at, args.think_ms, args.images) for t in teams))
+        elapsed = time.monotonic() - start
+    return stats, elapsed
+
+
+def print_report(rows: dict, elapsed: float):
+    header = f"{'endpoint':<32} {'count':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(f"\n{elapsed:.1f}s, latencies in ms\n{header}\n{'-' * len(header)}")
+    total = 0
+    for endpoint, row in rows.items():
+        total += row["count"]
+        print(f"{endpoint:<32} {row['count']:>7} {row['errors']:>5} {row['rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+    print(f"{'total':<32} {total:>7} {'':>5} {round(total / elapsed, 2):>8}")
+
+
+def check_thresholds(rows: dict, args) -> list[str]:
+    failures = []
+    for endpoint, row in rows.items():
+        if args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms:
+            failures.append(f"{endpoint}: p95 {row['p95_ms']} ms > {args.max_p95_ms} ms")
+        if args.max_error_rate is not None and row["errors"] / row["count"] > args.max_error_rate:
+            failures.append(f"{endpoint}: error rate {row['errors'] / row['count']:.3f} > {args.max_error_rate}")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running backend instead of starting one")
+    parser.add_argument("--teams", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--think-ms", type=float, default=250.0, help="mean pause between a team's requests")
+    parser.add_argument("--images", type=int, default=3, help="number of Pixel Fog round images to use")
+    parser.add_argument("--grids", type=int, default=8, help="distinct grids per team (repeats hit the cache)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="workers for the started backend (> 1 runs it under gunicorn.conf.py)")
+    parser.add_argument("--classifier", default="stub", choices=("stub", "torch", "int8", "onnx"))
+    parser.add_argument("--stub-ms", type=float, default=20.0, help="stub classifier time per batch")
+    parser.add_argument("--gemini-latency-ms", type=float, default=600.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout per request")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if any endpoint's p95 is above this")
+    parser.add_argument("--max-error-rate", type=float, help="fail if any endpoint's error rate is above this")
+    parser.add_argument("--fake-gemini", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.fake_gemini:
+        serve_fake_gemini(args.fake_gemini, args.gemini_latency_ms, args.gemini_error_rate)
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        procs = []
+        try:
+            if args.url:
+                base_url = args.url.rstrip("/")
+            else:
+                base_url, procs = start_servers(args, workdir)
+            health = wait_ready(base_url, args.ready_timeout)
+            print(f"backend {base_url} ready: classifier={health['classifier']['backend']}, "
+                  f"{args.teams} teams for {args.duration:.0f}s")
+            stats, elapsed = asyncio.run(run_load(base_url, args))
+        finally:
+            stop_servers(procs)
+
+    rows = stats.report(elapsed)
+    print_report(rows, elapsed)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "run_id": str(uuid.uuid4()),
+                "elapsed_s": round(elapsed, 2),
+                "args": {k: v for k, v in vars(args).items() if k != "fake_gemini"},
+                "endpoints": rows,
+            }, f, indent=2)
+
+    failures = check_thresholds(rows, args)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Minimal Prometheus-style metrics (counters and histograms with labels),
+rendered in the text exposition format by render() for GET /metrics.
+
+Values live in this process only; with several workers each one reports its
+own series, so scrape them per worker or sum them in the query.
+
+    REQUESTS = counter("http_requests_total", "HTTP requests.", ("route", "status"))
+    REQUESTS.inc(route="/ask", status="200")
+
+    LATENCY = histogram("gemini_request_seconds", "Gemini call latency.", ("call",))
+    with LATENCY.time(call="generate"):
+        ...
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for a cache hit and a slow Gemini answer alike
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics: list = []
+_metrics_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, series):
+        for key, value in series:
+            yield f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                entry = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, series):
+        bounds = self.buckets + (float("inf"),)
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = _fmt_labels(self.labelnames, key, f'le="{_fmt_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            plain = _fmt_labels(self.labelnames, key)
+            yield f"{self.name}_sum{plain} {_fmt_value(total)}"
+            yield f"{self.name}_count{plain} {count}"
+
+
+def _register(metric):
+    with _metrics_lock:
+        for existing in _metrics:
+            if existing.name == metric.name:
+                return existing  # module re-imported (e.g. --reload); keep one series set
+        _metrics.append(metric)
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    with _metrics_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
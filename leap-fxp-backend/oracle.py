@@ -0,0 +1,260 @@
+"""
+Async Gemini client for the Interrogation Room oracle.
+
+One genai.Client is shared by every request so its HTTP connection pool is
+reused, calls go through client.aio so they never block the event loop, and
+each call is bounded by a timeout and a concurrency limit.
+
+On top of that (see resilience.py):
+- a token bucket keeps us under the Gemini quota (``rate_per_minute``, per
+  process), queueing bursts for up to ``max_queue_wait`` seconds;
+- retryable failures (429, 5xx, timeouts, dropped connections) are retried
+  with jittered exponential backoff, at most ``max_attempts`` times; a
+  stream is only retried before its first chunk;
+- a circuit breaker stops calling Gemini after repeated failures, so callers
+  get resilience.Rejected right away and can fall back to something canned;
+- identical history-less prompts that are in flight at the same time share
+  one call.
+"""
+
+import asyncio
+import functools
+import time
+
+import httpx
+from google import genai
+from google.genai import types
+from google.genai.errors import APIError
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
+
+import metrics
+from resilience import CircuitBreaker, TokenBucket
+
+GEMINI_SECONDS = metrics.histogram(
+    "gemini_request_seconds", "Gemini call latency (whole answer for streams).", ("call", "outcome")
+)
+GEMINI_ERRORS = metrics.counter("gemini_errors_total", "Failed Gemini calls by exception type.", ("call", "error"))
+GEMINI_RETRIES = metrics.counter("gemini_retries_total", "Gemini calls retried after a retryable error.", ("call",))
+GEMINI_COALESCED = metrics.counter("gemini_coalesced_total", "Prompts answered by an identical call in flight.")
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Worth another try later: quota, overload, timeouts and dropped connections."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def _record(call: str, start: float, error: BaseException = None):
+    if error is None:
+        outcome = "ok"
+    elif isinstance(error, asyncio.TimeoutError):
+        outcome = "timeout"
+    elif isinstance(error, asyncio.CancelledError):
+        outcome = "cancelled"  # client went away; not an upstream error
+    else:
+        outcome = "error"
+    GEMINI_SECONDS.observe(time.perf_counter() - start, call=call, outcome=outcome)
+    if outcome in ("timeout", "error"):
+        GEMINI_ERRORS.inc(call=call, error=type(error).__name__)
+
+
+class OracleClient:
+    def __init__(self, api_key: str = None, model: str = "gemini-2.5-flash",
+                 timeout: float = 20.0, max_concurrency: int = 8, base_url: str = None,
+                 rate_per_minute: float = 0, burst: int = 10, max_queue_wait: float = 5.0,
+                 max_attempts: int = 3, breaker_failures: int = 5, breaker_reset: float = 30.0):
+        self.model = model
+        self.timeout = timeout
+        self.client = genai.Client(
+            api_key=api_key,
+            # base_url points the client at a stand-in server (see loadtest.py)
+            http_options=types.HttpOptions(timeout=int(timeout * 1000), base_url=base_url),  # milliseconds
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)  # rate 0 = unlimited
+        self.max_queue_wait = max_queue_wait
+        self.max_attempts = max(1, max_attempts)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    @staticmethod
+    def _config(system_prompt: str, temperature: float):
+        return types.GenerateContentConfig(system_instruction=system_prompt, temperature=temperature)
+
+    @staticmethod
+    def _contents(user_input: str, history=None):
+        """Earlier (question, answer) turns, if any, followed by the new question."""
+        if not history:
+            return [user_input]
+        contents = []
+        for question, answer in history:
+            contents.append({"role": "user", "parts": [{"text": question}]})
+            contents.append({"role": "model", "parts": [{"text": answer}]})
+        contents.append({"role": "user", "parts": [{"text": user_input}]})
+        return contents
+
+    def _retrying(self, call: str) -> AsyncRetrying:
+        return AsyncRetrying(
+            # Retries never outlast two timeouts in total, whatever max_attempts says
+            stop=stop_after_attempt(self.max_attempts) | stop_after_delay(2 * self.timeout),
+            wait=wait_random_exponential(multiplier=0.5, max=8),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=lambda _: GEMINI_RETRIES.inc(call=call),
+            reraise=True,
+        )
+
+    def _settle(self, error: BaseException = None):
+        """Tell the breaker how a call (including its retries) ended."""
+        if error is None:
+            self.breaker.success()
+        elif is_retryable(error):
+            self.breaker.failure()
+        else:
+            self.breaker.release()  # a bad request or a cancel says nothing about Gemini's health
+
+    async def generate(self, system_prompt: str, user_input: str, temperature: float = 0.9,
+                       history=None):
+        """
+        One non-streaming completion. Raises resilience.Rejected without
+        calling Gemini (circuit open / no quota slot soon enough), or the last
+        error once retries are used up.
+        """
+        if history:
+            return await self._generate(system_prompt, user_input, temperature, history)
+
+        # Same prompt already on its way (e.g. several teams asking the same first question)
+        key = (system_prompt, user_input, temperature)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(system_prompt, user_input, temperature))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._call_done, key))
+        else:
+            GEMINI_COALESCED.inc()
+        # shield: one waiter giving up must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _call_done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # every waiter already got it; don't log "never retrieved"
+
+    async def _generate(self, system_prompt, user_input, temperature, history=None):
+        self.breaker.allow()
+        try:
+            async for attempt in self._retrying("generate"):
+                with attempt:
+                    response = await self._generate_once(system_prompt, user_input, temperature, history)
+        except BaseException as e:
+            self._settle(e)
+            raise
+        self._settle()
+        return response
+
+    async def _generate_once(self, system_prompt, user_input, temperature, history):
+        await self.bucket.acquire(self.max_queue_wait)
+        async with self._slots:
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.model,
+                        contents=self._contents(user_input, history),
+                        config=self._config(system_prompt, temperature),
+                    ),
+                    timeout=self.timeout,
+                )
+            except BaseException as e:
+                _record("generate", start, e)
+                raise
+            _record("generate", start)
+            return response
+
+    async def stream(self, system_prompt: str, user_input: str, temperature: float = 0.9,
+                     history=None):
+        """
+        Yield response chunks as they arrive; the timeout applies to each chunk.
+        Retries (and the same exceptions as generate()) apply until the first
+        chunk is out; after that an error ends the stream.
+        """
+        self.breaker.allow()
+        try:
+            async for attempt in self._retrying("stream"):
+                with attempt:
+                    it, first, start = await self._open_stream(system_prompt, user_input, temperature, history)
+        except BaseException as e:
+            self._settle(e)
+            raise
+
+        try:
+            try:
+                if first is not None:
+                    yield first
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(it.__anext__(), timeout=self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        yield chunk
+            finally:
+                self._slots.release()
+        except GeneratorExit:
+            self.breaker.release()  # consumer stopped early; nothing to record
+            raise
+        except BaseException as e:
+            _record("stream", start, e)
+            self._settle(e)
+            raise
+        _record("stream", start)
+        self._settle()
+
+    async def _open_stream(self, system_prompt, user_input, temperature, history):
+        """
+        Start a stream and wait for its first chunk (None if it is empty).
+        On success the concurrency slot stays taken until stream() releases it.
+        """
+        await self.bucket.acquire(self.max_queue_wait)
+        await self._slots.acquire()
+        start = time.perf_counter()
+        try:
+            chunks = await asyncio.wait_for(
+                self.client.aio.models.generate_content_stream(
+                    model=self.model,
+                    contents=self._contents(user_input, history),
+                    config=self._config(system_prompt, temperature),
+                ),
+                timeout=self.timeout,
+            )
+            it = chunks.__aiter__()
+            try:
+                first = await asyncio.wait_for(it.__anext__(), timeout=self.timeout)
+            except StopAsyncIteration:
+                first = None
+        except BaseException as e:
+            self._slots.release()
+            _record("stream", start, e)
+            raise
+        return it, first, start
+
+    def status(self) -> dict:
+        return {
+            "model": self.model,
+            "circuit": self.breaker.status(),
+            "rate_limit": self.bucket.status(),
+            "in_flight": len(self._inflight),
+        }
+
+    async def warm_up(self):
+        """
+        One cheap metadata call (no tokens) so TLS and the connection pool are
+        set up before the first question, and a bad key or model name shows up now.
+        """
+        await asyncio.wait_for(self.client.aio.models.get(model=self.model), timeout=self.timeout)
+
+    async def aclose(self):
+        await self.client.aio.aclose()
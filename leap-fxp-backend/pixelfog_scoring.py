@@ -0,0 +1,122 @@
+"""
+Server-side scoring for Pixel Fog submissions.
+
+The editor works on a GRID x GRID cell grid and submits the edited grid as a
+large JPEG. Its starting grid comes from here (editor_grid(), returned by
+POST /pixelfog/image) rather than from the browser's own resampling of the
+round image: canvas drawImage() downsamples differently from PIL, and the
+untouched image would already count dozens of changed cells. Near-white /
+transparent cells are empty and drawn in the background colour. The client
+also sends how many cells it changed, but that number is only a claim.
+Here both sides are reduced to one colour per cell and compared with NumPy,
+so the changed-cell count comes from the pixels themselves.
+
+Cells whose colours differ by more than ``tolerance`` on any channel count
+as changed; the slack absorbs JPEG noise, while palette colours are far
+apart.
+
+Every submission is compared with the reference in full (2500 cells, next
+to nothing next to the model). Diffing only against the team's previous
+submission would let small steps add up without ever being counted. The
+previous submission is kept only to report how many cells moved since, and
+the verdict always comes from the model (identical submissions are already
+answered by the result cache in front of it).
+"""
+
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+GRID = 50
+BACKGROUND = (0x21, 0x14, 0x2F)  # what the editor draws for empty cells
+
+
+def reference_grid(image, cells: int = GRID) -> np.ndarray:
+    """Cell colours of a round image as the editor shows them -> uint8 (cells, cells, 3)."""
+    rgba = np.asarray(image.convert("RGBA").resize((cells, cells), resample=Image.BOX))
+    grid = rgba[..., :3].copy()
+    empty = (rgba[..., 3] < 128) | np.all(grid > 250, axis=-1)
+    grid[empty] = BACKGROUND
+    return grid
+
+
+def changed_cells(a: np.ndarray, b: np.ndarray, tolerance: int) -> np.ndarray:
+    """Boolean mask of cells whose colours differ by more than ``tolerance`` on any channel."""
+    return (np.abs(a.astype(np.int16) - b.astype(np.int16)) > tolerance).any(axis=-1)
+
+
+@dataclass(frozen=True)
+class Score:
+    changed: int           # cells that differ from the reference image
+    fooled: bool           # the classifier no longer sees the expected label
+    margin: float | None   # distance from flipping the verdict, > 0 while not fooled (classifier.margins)
+    moved: int             # cells that differ from the team's previous submission (-1 if none)
+
+
+class _Last:
+    __slots__ = ("etag", "grid")
+
+    def __init__(self, etag, grid):
+        self.etag = etag
+        self.grid = grid
+
+
+class PixelFogScorer:
+    def __init__(self, cells: int = GRID, tolerance: int = 48, jitter: int = 8):
+        # jitter: a cell closer than this to the previous submission hasn't moved
+        self.cells = cells
+        self.tolerance = tolerance
+        self.jitter = jitter
+        self._references: dict[str, np.ndarray] = {}  # etag -> grid
+        self._editor: dict[str, list] = {}  # etag -> editor_grid()
+        self._last: dict[tuple[str, int], _Last] = {}
+        self._lock = threading.Lock()
+
+    def reference(self, stored) -> np.ndarray:
+        """Reference grid for an image_store.StoredImage, computed once per ETag."""
+        grid = self._references.get(stored.etag)
+        if grid is None:
+            with Image.open(BytesIO(stored.data)) as img:
+                grid = reference_grid(img, self.cells)
+            grid.flags.writeable = False
+            with self._lock:
+                self._references[stored.etag] = grid
+        return grid
+
+    def editor_grid(self, stored) -> list[list[str | None]]:
+        """The reference grid as the editor starts from it: "#rrggbb" per cell, None for empty cells."""
+        cells = self._editor.get(stored.etag)
+        if cells is None:
+            grid = self.reference(stored)
+            empty = np.all(grid == BACKGROUND, axis=-1)
+            cells = [
+                [None if empty[y, x] else "#%02x%02x%02x" % tuple(int(c) for c in grid[y, x])
+                 for x in range(self.cells)]
+                for y in range(self.cells)
+            ]
+            with self._lock:
+                self._editor[stored.etag] = cells
+        return cells
+
+    def evaluate(self, team: str, index: int, stored, grid: np.ndarray, classify) -> Score:
+        """
+        Score ``grid`` (cell colours of the submission) against round image
+        ``stored``. ``classify()`` -> (fooled, margin) runs the model.
+        """
+        reference = self.reference(stored)
+        changed = int(changed_cells(grid, reference, self.tolerance).sum())
+
+        key = (team, index)
+        last = self._last.get(key)
+        if last is not None and last.etag == stored.etag:
+            moved = int(changed_cells(grid, last.grid, self.jitter).sum())
+        else:
+            moved = -1
+
+        fooled, margin = classify()
+        with self._lock:
+            self._last[key] = _Last(stored.etag, grid)
+        return Score(changed, fooled, margin, moved)
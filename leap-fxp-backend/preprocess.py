@@ -0,0 +1,186 @@
+"""
+Pixel Fog submission decoding in a process pool.
+
+A submission is a base64 PNG data URL. Decoding it, converting to RGB,
+resizing to the model input and normalizing are all pure-Python / PIL work
+that holds the GIL, so with the request threads doing it a busy round was
+capped at roughly one core no matter how many were free.
+
+Preprocessor hands that work to worker processes. Each worker writes the
+finished float32 CHW array into a fresh shared-memory block and returns only
+its name; the server maps the block, the batcher stacks it straight into the
+model input and then releases it. The arrays never go through pickle.
+
+The worker only needs numpy and PIL (no torch), so the pool starts quickly
+and is spawned rather than forked from a process that may hold model threads.
+
+Submissions are capped before they reach a worker (``max_payload`` base64
+characters, MAX_PIXELS decoded pixels). If a worker dies anyway (e.g. killed
+for memory) the pool is replaced and the submission tried once more, instead
+of every later call failing with BrokenProcessPool.
+"""
+
+import base64
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+import metrics
+from result_cache import image_key
+
+MAX_PIXELS = 4096 * 4096  # the editor submits 1000 x 1000
+
+POOL_RESTARTS = metrics.counter("preprocess_pool_restarts_total", "Decode pools replaced after a worker died.")
+
+
+class PayloadTooLarge(ValueError):
+    """The submission is bigger than we are willing to decode."""
+
+
+def decode(encoded: str) -> Image.Image:
+    """base64 payload (the part after the comma of a data URL) -> RGB image."""
+    image = Image.open(BytesIO(base64.b64decode(encoded)))
+    # Checked on the header, before a small PNG can expand into gigabytes of pixels
+    if image.width * image.height > MAX_PIXELS:
+        raise PayloadTooLarge(f"image is {image.width} x {image.height} pixels")
+    return image.convert("RGB")
+
+
+def to_pixels(image: Image.Image, spec: dict) -> np.ndarray:
+    """
+    Resize + rescale + normalize like the model's image processor.
+    ``spec`` comes from ModelRegistry.preprocess_spec(); returns float32 (3, H, W).
+    """
+    height, width = spec["size"]
+    if image.size != (width, height):
+        image = image.resize((width, height), resample=spec["resample"])
+    pixels = np.asarray(image, dtype=np.float32) * np.float32(spec["rescale"])
+    pixels -= np.asarray(spec["mean"], dtype=np.float32)
+    pixels /= np.asarray(spec["std"], dtype=np.float32)
+    return np.ascontiguousarray(pixels.transpose(2, 0, 1))
+
+
+def cell_colors(image: Image.Image, cells: int) -> np.ndarray:
+    """Mean RGB of each cell of a ``cells`` x ``cells`` grid -> uint8 (cells, cells, 3)."""
+    return np.asarray(image.convert("RGB").resize((cells, cells), resample=Image.BOX))
+
+
+def _prepare_shared(encoded: str, spec: dict, cells: int = 0):
+    """Runs in a worker process: decode + preprocess into a new shared-memory block."""
+    image = decode(encoded)
+    key = image_key(image)
+    grid = cell_colors(image, cells) if cells else None
+    pixels = to_pixels(image, spec)
+
+    shm = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+    try:
+        np.ndarray(pixels.shape, pixels.dtype, buffer=shm.buf)[...] = pixels
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, pixels.shape, pixels.dtype.str, key, grid
+
+
+class Prepared:
+    """
+    One preprocessed submission: ``pixels`` (float32 CHW), ``key`` (content
+    hash of the decoded image) and, if asked for, ``grid`` (cell colours, see
+    cell_colors()). Call release() once the pixels were used; it is safe to
+    call more than once.
+    """
+
+    __slots__ = ("pixels", "key", "grid", "_shm")
+
+    def __init__(self, pixels: np.ndarray, key: str, grid: np.ndarray = None, shm=None):
+        self.pixels = pixels
+        self.key = key
+        self.grid = grid
+        self._shm = shm
+
+    @classmethod
+    def attach(cls, name: str, shape: tuple, dtype: str, key: str, grid=None) -> "Prepared":
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(np.ndarray(shape, np.dtype(dtype), buffer=shm.buf), key, grid, shm)
+
+    def release(self):
+        if self._shm is not None:
+            self.pixels = None  # drop the view before closing the mapping
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class Preprocessor:
+    def __init__(self, workers: int = 2, max_payload: int = 8 * 1024 * 1024):
+        # workers=0 keeps everything in the calling thread (handy for debugging)
+        self.workers = workers
+        self.max_payload = max_payload
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._pool
+
+    def _replace(self, broken: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next _executor() call starts a new one."""
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+                POOL_RESTARTS.inc()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, encoded: str):
+        """Raise PayloadTooLarge before anything is decoded."""
+        if len(encoded) > self.max_payload:
+            raise PayloadTooLarge(f"payload is {len(encoded)} bytes, the limit is {self.max_payload}")
+
+    def prepare(self, encoded: str, spec: dict, cells: int = 0, timeout: float = 30.0) -> Prepared:
+        """
+        Decode + preprocess one submission; blocks the calling thread only.
+        cells > 0 also returns the submission's cell colours as ``grid``.
+        Raises PayloadTooLarge for oversized submissions.
+        """
+        self.check(encoded)
+        if self.workers <= 0:
+            image = decode(encoded)
+            grid = cell_colors(image, cells) if cells else None
+            return Prepared(to_pixels(image, spec), image_key(image), grid)
+        for attempt in range(2):
+            pool = self._executor()
+            try:
+                future = pool.submit(_prepare_shared, encoded, spec, cells)
+                result = future.result(timeout)
+            except BrokenProcessPool:
+                self._replace(pool)
+                if attempt:
+                    raise
+                continue
+            except TimeoutError:
+                # Nobody will attach to the block the worker is still writing; free it when it lands
+                future.add_done_callback(_discard)
+                raise
+            return Prepared.attach(*result)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _discard(future):
+    if not future.cancelled() and future.exception() is None:
+        Prepared.attach(*future.result()).release()
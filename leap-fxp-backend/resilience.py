@@ -0,0 +1,105 @@
+"""
+Rate limiting and circuit breaking for calls to an external API (Gemini).
+
+TokenBucket: ``rate`` calls per second with bursts up to ``burst``. Callers
+reserve a slot and sleep until it comes up, so a burst at the start of a
+round is spread out instead of being answered with 429s; a caller that would
+have to wait longer than ``max_wait`` is turned away with RateLimited.
+
+CircuitBreaker: after ``failure_threshold`` failures in a row the circuit
+opens and calls fail fast with CircuitOpen for ``reset_timeout`` seconds.
+Then one trial call is let through; it closes the circuit on success and
+re-opens it on failure.
+
+Both are meant for a single event loop (no locks).
+"""
+
+import time
+
+
+class Rejected(Exception):
+    """The call was not attempted (see the subclasses)."""
+
+
+class RateLimited(Rejected):
+    pass
+
+
+class CircuitOpen(Rejected):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float = None) -> float:
+        """Take a token; returns how long to sleep before using it."""
+        if self.rate <= 0:
+            return 0.0  # unlimited
+        self._refill(time.monotonic())
+        wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+        if max_wait is not None and wait > max_wait:
+            raise RateLimited(f"would wait {wait:.1f}s for a request slot")
+        self._tokens -= 1  # may go negative: later callers queue behind this one
+        return wait
+
+    async def acquire(self, max_wait: float = None):
+        import asyncio
+
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def status(self) -> dict:
+        self._refill(time.monotonic())
+        return {"rate_per_s": self.rate, "burst": self.capacity, "tokens": round(self._tokens, 2)}
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"  # closed -> open -> half_open -> closed | open
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        if self.state == "closed":
+            return
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpen("upstream is failing; not calling it for now")
+            self.state = "half_open"
+            self._trial = False
+        if self._trial:
+            raise CircuitOpen("waiting for the trial call to finish")
+        self._trial = True
+
+    def success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self):
+        """The call ended without telling us anything (e.g. it was cancelled)."""
+        self._trial = False
+
+    def status(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
@@ -0,0 +1,65 @@
+"""
+Small thread-safe LRU cache with hit/miss counters.
+
+Used to skip work for requests we have already answered, e.g. a Pixel Fog
+grid that a team resubmits unchanged.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def image_key(image, *extra) -> str:
+    """Content hash of a decoded PIL image (pixels, mode and size) plus any extra parts."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{image.mode}:{image.size}:{extra!r}".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
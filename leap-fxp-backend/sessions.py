@@ -0,0 +1,73 @@
+"""
+Per-team Interrogation Room state.
+
+Each team gets its own small GameState record (``__slots__``, no per-instance
+dict) in a SessionStore that evicts sessions idle for longer than ``ttl``
+seconds and, past ``max_sessions``, the least recently used ones.
+
+The store lives in process memory. The stage a team reached is also written
+to the event state backend and picked up by every worker, so with several
+workers only the recent conversation (history) is per worker.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class GameState:
+    __slots__ = ("stage", "guesses_used", "prompt_count", "history", "last_seen", "lock")
+
+    def __init__(self, history_turns: int = 0):
+        self.stage = 0
+        self.guesses_used = 0
+        self.prompt_count = 0
+        # (question, answer) pairs sent back to Gemini as context; empty when disabled
+        self.history = deque(maxlen=history_turns) if history_turns > 0 else None
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()  # one question at a time per team
+
+    def remember(self, question: str, answer: str):
+        if self.history is not None:
+            self.history.append((question, answer))
+
+
+class SessionStore:
+    def __init__(self, ttl: float = 3 * 3600, max_sessions: int = 1024, history_turns: int = 0):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.history_turns = history_turns
+        self._sessions: OrderedDict[str, GameState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> GameState:
+        """Existing state for ``key`` (refreshing its TTL) or a fresh one."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None and now - state.last_seen > self.ttl:
+                state = None
+            if state is None:
+                state = GameState(self.history_turns)
+                self._sessions[key] = state
+            state.last_seen = now
+            self._sessions.move_to_end(key)
+            self._evict(now)
+            return state
+
+    def drop(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _evict(self, now: float):
+        # Oldest first: stop at the first session that is neither expired nor over the cap
+        while self._sessions:
+            key, state = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - state.last_seen > self.ttl:
+                self._sessions.popitem(last=False)
+            else:
+                break
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,262 @@
+"""
+Event state shared by every worker: team scores, per-game completion sets
+and a few metadata values (e.g. the server session key, game open/closed).
+
+STATE_BACKEND selects the implementation:
+  memory                 - plain dicts/sets, single process only (default)
+  sqlite:///path/to.db   - SQLite in WAL mode; safe for several worker
+                           processes on one machine and survives restarts
+
+Score increments and min_meta() (keep the lower number) are atomic in both. The SQLite backend batches them in a
+background thread (one transaction every ``flush_interval`` seconds) and
+flushes its own pending increments before any score read; completions and
+metadata are written through immediately since they gate access.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+class StateBackend:
+    def incr_score(self, team: str, delta: int = 1):
+        raise NotImplementedError
+
+    def get_score(self, team: str) -> int:
+        raise NotImplementedError
+
+    def scores(self) -> dict[str, int]:
+        raise NotImplementedError
+
+    def add_completed(self, game: str, team: str) -> bool:
+        """Mark ``team`` done with ``game``; True only for the call that added it."""
+        raise NotImplementedError
+
+    def is_completed(self, game: str, team: str) -> bool:
+        raise NotImplementedError
+
+    def completed(self, game: str) -> set[str]:
+        raise NotImplementedError
+
+    def get_or_set_meta(self, key: str, value: str) -> str:
+        """Store ``value`` under ``key`` unless something is already there; return the stored value."""
+        raise NotImplementedError
+
+    def get_meta(self, key: str, default: str = None) -> str | None:
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: str):
+        raise NotImplementedError
+
+    def min_meta(self, key: str, value: int) -> int:
+        """Store ``value`` under ``key`` unless a lower number is already there; return the stored number."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self):
+        self._scores = defaultdict(int)
+        self._completed = defaultdict(set)
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def incr_score(self, team, delta=1):
+        with self._lock:
+            self._scores[team] += delta
+
+    def get_score(self, team):
+        return self._scores.get(team, 0)
+
+    def scores(self):
+        with self._lock:
+            return dict(self._scores)
+
+    def add_completed(self, game, team):
+        with self._lock:
+            done = self._completed[game]
+            if team in done:
+                return False
+            done.add(team)
+            return True
+
+    def is_completed(self, game, team):
+        return team in self._completed.get(game, ())
+
+    def completed(self, game):
+        with self._lock:
+            return set(self._completed.get(game, ()))
+
+    def get_or_set_meta(self, key, value):
+        with self._lock:
+            return self._meta.setdefault(key, value)
+
+    def get_meta(self, key, default=None):
+        return self._meta.get(key, default)
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._meta[key] = value
+
+    def min_meta(self, key, value):
+        with self._lock:
+            current = self._meta.get(key)
+            if current is None or value < int(current):
+                self._meta[key] = str(value)
+                return value
+            return int(current)
+
+
+class SQLiteBackend(StateBackend):
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scores (team TEXT PRIMARY KEY, score INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS completed (game TEXT NOT NULL, team TEXT NOT NULL, PRIMARY KEY (game, team));
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.05):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending = defaultdict(int)
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self._SCHEMA)
+
+        self._start_writer()
+        # Pre-fork servers (gunicorn.conf.py) create this in the master and fork it
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._writer.start()
+
+    def _after_fork(self):
+        # Threads, locks and sqlite connections don't survive fork. Keep the
+        # parent's connections referenced but unused: closing them here could
+        # checkpoint or clean up WAL files the parent still has open.
+        self._inherited = self._local
+        self._local = threading.local()
+        self._pending = defaultdict(int)
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start_writer()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # increments stay pending; retried on the next tick
+        self.flush()
+
+    def flush(self):
+        """Write all pending score increments in one transaction."""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, defaultdict(int)
+
+            conn = self._conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO scores (team, score) VALUES (?, ?) "
+                    "ON CONFLICT(team) DO UPDATE SET score = score + excluded.score",
+                    batch.items(),
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                with self._pending_lock:  # keep the increments for the next attempt
+                    for team, delta in batch.items():
+                        self._pending[team] += delta
+                raise
+
+    def incr_score(self, team, delta=1):
+        with self._pending_lock:
+            self._pending[team] += delta
+
+    def get_score(self, team):
+        self.flush()
+        row = self._conn().execute("SELECT score FROM scores WHERE team = ?", (team,)).fetchone()
+        return row[0] if row else 0
+
+    def scores(self):
+        self.flush()
+        return dict(self._conn().execute("SELECT team, score FROM scores").fetchall())
+
+    def add_completed(self, game, team):
+        cur = self._conn().execute("INSERT OR IGNORE INTO completed (game, team) VALUES (?, ?)", (game, team))
+        return cur.rowcount == 1
+
+    def is_completed(self, game, team):
+        row = self._conn().execute(
+            "SELECT 1 FROM completed WHERE game = ? AND team = ?", (game, team)
+        ).fetchone()
+        return row is not None
+
+    def completed(self, game):
+        rows = self._conn().execute("SELECT team FROM completed WHERE game = ?", (game,)).fetchall()
+        return {team for (team,) in rows}
+
+    def get_or_set_meta(self, key, value):
+        conn = self._conn()
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self._conn().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def min_meta(self, key, value):
+        # One statement, so concurrent writers (threads or worker processes) can't undo a lower value;
+        # meta values are TEXT, hence the casts
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+            "WHERE CAST(excluded.value AS INTEGER) < CAST(meta.value AS INTEGER)",
+            (key, str(value)),
+        )
+        return int(conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0])
+
+    def close(self):
+        self._stop.set()
+        self._writer.join(timeout=2 * self.flush_interval + 1)
+
+
+def make_backend(spec: str) -> StateBackend:
+    """Build a backend from a STATE_BACKEND value ("memory" or "sqlite:///path")."""
+    spec = (spec or "memory").strip()
+    if spec == "memory":
+        return MemoryBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(spec[len("sqlite:///"):])
+    raise ValueError(f"Unknown STATE_BACKEND {spec!r}")
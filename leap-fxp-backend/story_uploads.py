@@ -0,0 +1,182 @@
+"""
+Story Hunt upload pipeline.
+
+- stream_to_disk(): copies an UploadFile to disk with aiofiles (no blocking
+  writes on the event loop), checking the image magic bytes on the first
+  chunk and the size limit on every chunk. Partial files are removed.
+- TeamIndex: next imageK number per team, kept in memory after one
+  directory scan instead of globbing the folder on every upload; numbers
+  are claimed with marker files so several workers can share the folder.
+  A batch that is rejected gives its numbers back.
+- Thumbnailer: downscaled JPEG copies for the gallery, made in a process
+  pool so large phone photos don't hold the GIL of the server process.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import aiofiles
+
+CHUNK_SIZE = 1024 * 1024
+
+_IDX_PAT = re.compile(r"image(\d+)", re.IGNORECASE)
+
+
+class UploadRejected(Exception):
+    """The upload isn't an accepted image or is too large."""
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """File extension for the image format in the first bytes, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"heim", b"heis", b"mif1", b"msf1"):
+            return ".heic"
+        if brand in (b"avif", b"avis"):
+            return ".avif"
+    if head.startswith(b"BM"):
+        return ".bmp"
+    return None
+
+
+async def stream_to_disk(upload, dest: Path, max_bytes: int) -> tuple[Path, int]:
+    """
+    Write ``upload`` to ``dest`` (its suffix is replaced by the sniffed format).
+    Returns (final_path, size); raises UploadRejected and leaves nothing behind.
+    """
+    first = await upload.read(CHUNK_SIZE)
+    ext = sniff_image_type(first[:16])
+    if ext is None:
+        raise UploadRejected(f"{upload.filename} is not a supported image.")
+
+    final = dest.with_suffix(ext)
+    tmp = final.with_name(f".{final.name}.part")
+    size = 0
+    try:
+        async with aiofiles.open(tmp, "wb") as out:
+            chunk = first
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"{upload.filename} is larger than {max_bytes // (1024 * 1024)} MB.")
+                await out.write(chunk)
+                chunk = await upload.read(CHUNK_SIZE)
+        await asyncio.to_thread(os.replace, tmp, final)
+    except BaseException:
+        await asyncio.to_thread(_unlink_quietly, tmp)
+        raise
+    return final, size
+
+
+def _unlink_quietly(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class TeamIndex:
+    """
+    Next free imageK number per team; the folder is scanned once per team.
+    Each number is claimed with an O_EXCL marker file (.<prefix>imageK.claim)
+    next to the images, so worker processes sharing the folder never hand
+    out the same one even though each keeps its own counter.
+    """
+
+    def __init__(self):
+        self._next: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _claim(folder: Path, prefix: str, number: int) -> Path:
+        return folder / f".{prefix}image{number}.claim"
+
+    def reserve(self, key: str, folder: Path, prefix: str, count: int) -> list[int]:
+        """Claim ``count`` free numbers (ascending, not necessarily consecutive)."""
+        with self._lock:
+            number = self._next.get(key)
+            if number is None:
+                number = self._scan(folder, prefix)
+            numbers = []
+            while len(numbers) < count:
+                try:
+                    fd = os.open(self._claim(folder, prefix, number), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    pass  # taken by another process
+                else:
+                    os.close(fd)
+                    numbers.append(number)
+                number += 1
+            self._next[key] = number
+            return numbers
+
+    def release(self, key: str, folder: Path, prefix: str, numbers: list[int]):
+        """Give back numbers that weren't used."""
+        for number in numbers:
+            self._claim(folder, prefix, number).unlink(missing_ok=True)
+        if numbers:
+            with self._lock:
+                self._next[key] = min(self._next.get(key, numbers[0]), numbers[0])
+
+    @staticmethod
+    def _scan(folder: Path, prefix: str) -> int:
+        idxs = []
+        for f in folder.glob(f"{prefix}image*.*"):
+            m = _IDX_PAT.search(f.name)
+            if m:
+                idxs.append(int(m.group(1)))
+        return (max(idxs) + 1) if idxs else 1
+
+
+def make_thumbnail(src: str, dest: str, max_side: int) -> str:
+    """Runs in a worker process: downscale ``src`` to a JPEG at ``dest``."""
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        img.convert("RGB").save(dest, "JPEG", quality=80, optimize=True)
+    return dest
+
+
+class Thumbnailer:
+    def __init__(self, max_side: int = 320, workers: int = 2):
+        self.max_side = max_side
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn, not fork: the server process runs model, batcher and state-writer threads
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._pool
+
+    def submit(self, src: Path, dest: Path):
+        """Start a thumbnail in the background; failures only mean no thumbnail."""
+        future = self._executor().submit(make_thumbnail, str(src), str(dest), self.max_side)
+        future.add_done_callback(lambda f: f.exception())  # consume errors (e.g. HEIC without a plugin)
+        return future
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
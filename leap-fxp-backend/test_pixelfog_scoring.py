@@ -0,0 +1,68 @@
+"""
+Regression tests for pixelfog_scoring.PixelFogScorer.
+
+    python -m pytest test_pixelfog_scoring.py
+"""
+
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from pixelfog_scoring import GRID, PixelFogScorer  # noqa: E402
+
+BASE = (100, 60, 40)
+
+
+def _stored(color=BASE, etag="round-0"):
+    """Stand-in for image_store.StoredImage: a solid round image."""
+    buf = BytesIO()
+    Image.new("RGB", (500, 500), color).save(buf, "PNG")
+    return SimpleNamespace(etag=etag, data=buf.getvalue())
+
+
+def _classifier(calls):
+    def classify():
+        calls.append(1)
+        return False, 1.0
+    return classify
+
+
+def test_untouched_grid_counts_nothing():
+    scorer = PixelFogScorer()
+    stored = _stored()
+    grid = scorer.reference(stored).copy()
+    assert scorer.evaluate("team1", 0, stored, grid, _classifier([])).changed == 0
+
+
+def test_small_steps_add_up_against_the_reference():
+    # Every cell +7 per resubmission (under the jitter) plus one big change so
+    # the grid always differs: after 10 rounds every cell is 70 levels off.
+    scorer = PixelFogScorer()
+    stored = _stored()
+    grid = scorer.reference(stored).astype(np.int16)
+    calls = []
+    for step in range(1, 11):
+        grid += 7
+        submitted = grid.copy()
+        submitted[0, 0] = (255, 0, 255) if step % 2 else (0, 255, 0)
+        score = scorer.evaluate("team1", 0, stored, submitted.clip(0, 255).astype(np.uint8), _classifier(calls))
+    assert score.changed == GRID * GRID
+    assert len(calls) == 10
+
+
+def test_small_change_still_runs_the_model():
+    scorer = PixelFogScorer()
+    stored = _stored()
+    grid = scorer.reference(stored).copy()
+    calls = []
+    scorer.evaluate("team1", 0, stored, grid, _classifier(calls))
+    nudged = grid.copy()
+    nudged[10:20, 10:20] += 5
+    score = scorer.evaluate("team1", 0, stored, nudged, _classifier(calls))
+    assert len(calls) == 2
+    assert score.moved == 0
+    assert score.changed == 0